@@ -7,43 +7,104 @@ Usage:
 
 Features:
     - Batch fetching with configurable size
-    - Automatic retries with exponential backoff
-    - Checkpointing for crash recovery
+    - Concurrent fetching over a pooled keep-alive session
+    - Token-bucket rate limiting instead of a fixed delay between batches
+    - Automatic retries with capped, jittered exponential backoff
+    - Append-only JSONL checkpointing for crash recovery
     - Filters out posts with null title/content
+    - Stores each post as a flat PostRecord with only the fields used downstream
 """
 
 import argparse
 import json
 import os
-import socket
+import random
 import time
-import urllib.request
-import urllib.error
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict
+from typing import BinaryIO, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from upload_utils import PostRecord, TokenBucket
+
+try:
+    import orjson
+except ImportError:  # Fall back to the (slower) stdlib encoder
+    orjson = None
 
 API_BASE = "https://www.moltbook.com/api/v1"
 DEFAULT_BATCH_SIZE = 25
 DEFAULT_MAX_RETRIES = 5
 DEFAULT_RETRY_DELAY = 3
+DEFAULT_MAX_BACKOFF = 60
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_RATE_CAPACITY = 5
+DEFAULT_RATE_PER_SECOND = 2.0
+CHECKPOINT_BUFFER_SIZE = 1 << 20
+CHECKPOINT_FSYNC_INTERVAL = 5  # batches
+
+# Shared session so every batch reuses the same keep-alive connections
+# instead of paying a fresh TCP+TLS handshake per request. scrape_moltbook
+# mounts its pooled adapter, sized for the concurrent fetchers.
+_SESSION = requests.Session()
+_SESSION.headers["User-Agent"] = "MoltbookScraper/1.0"
+
+# Returned by fetch_posts when the server answers 304 to an If-None-Match request
+NOT_MODIFIED = object()
+
 
+def dumps_json(obj, indent: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes (PostRecords included), using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False, default=asdict).encode("utf-8")
 
-def fetch_posts(offset: int = 0, limit: int = 25, max_retries: int = 5, retry_delay: int = 3) -> Optional[dict]:
-    """Fetch a batch of posts from the Moltbook API with retry logic."""
+
+def loads_json(data: bytes):
+    """Parse JSON from bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def fetch_posts(
+    offset: int = 0,
+    limit: int = 25,
+    max_retries: int = 5,
+    retry_delay: int = 3,
+    max_backoff: int = 60,
+    rate_limiter: Optional[TokenBucket] = None,
+    etag: Optional[str] = None
+):
+    """
+    Fetch a batch of posts from the Moltbook API with retry logic.
+    
+    Returns the parsed response (with the response ETag under "_etag"),
+    NOT_MODIFIED if `etag` still matches, or None if every attempt failed.
+    """
     url = f"{API_BASE}/posts?sort=top&limit={limit}&offset={offset}"
+    headers = {"If-None-Match": etag} if etag else None
     
     for attempt in range(max_retries):
         try:
-            req = urllib.request.Request(url)
-            req.add_header("User-Agent", "MoltbookScraper/1.0")
-            
-            with urllib.request.urlopen(req, timeout=60) as response:
-                return json.loads(response.read().decode("utf-8"))
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            response = _SESSION.get(url, headers=headers, timeout=60)
+            if response.status_code == 304:
+                return NOT_MODIFIED
+            response.raise_for_status()
+            data = loads_json(response.content)
+            data["_etag"] = response.headers.get("ETag")
+            return data
                 
-        except (urllib.error.URLError, urllib.error.HTTPError, TimeoutError, socket.timeout, OSError) as e:
+        except (requests.RequestException, ValueError) as e:
             print(f"  Attempt {attempt + 1}/{max_retries} failed: {type(e).__name__}: {e}")
             if attempt < max_retries - 1:
-                wait_time = retry_delay * (2 ** attempt)  # Exponential backoff
-                print(f"  Retrying in {wait_time}s...")
+                # Capped exponential backoff, jittered so concurrent workers don't retry in lockstep
+                wait_time = min(retry_delay * (2 ** attempt), max_backoff) + random.uniform(0, retry_delay)
+                print(f"  Retrying in {wait_time:.1f}s...")
                 time.sleep(wait_time)
             else:
                 print(f"  Failed after {max_retries} attempts")
@@ -51,33 +112,90 @@ def fetch_posts(offset: int = 0, limit: int = 25, max_retries: int = 5, retry_de
     return None
 
 
-def is_valid_post(post: dict) -> bool:
-    """Check if post has non-null title and content."""
-    return post.get("title") is not None and post.get("content") is not None
+def load_checkpoint(checkpoint_file: str) -> Optional[dict]:
+    """
+    Replay the append-only checkpoint log if it exists.
+    
+    If the last batch was saved with an ETag, it is held back under "pending"
+    (and cut from the log) so the resumed scrape can revalidate it with
+    If-None-Match instead of trusting a possibly stale ranking.
+    """
+    if not os.path.exists(checkpoint_file):
+        return None
+    
+    posts = []
+    offset = None
+    pending = None
+    pending_start = 0
+    valid_bytes = 0
+    with open(checkpoint_file, "rb") as f:
+        for line in f:
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("truncated entry")
+                entry = loads_json(line)
+                batch_posts = [PostRecord(**p) for p in entry["posts"]]
+                batch_offset = entry["offset"]
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Warning: Ignoring corrupted checkpoint entries from byte {valid_bytes}: {e}")
+                break
+            
+            if pending is not None:
+                posts.extend(pending["posts"])
+                pending = None
+            if entry.get("etag"):
+                pending = {
+                    "batch_offset": entry["batch_offset"],
+                    "etag": entry["etag"],
+                    "offset": batch_offset,
+                    "posts": batch_posts,
+                }
+                pending_start = valid_bytes
+            else:
+                posts.extend(batch_posts)
+            offset = batch_offset
+            valid_bytes += len(line)
+    
+    # Drop a torn tail (and the held-back batch) so new entries are appended after the last kept line
+    keep_bytes = valid_bytes
+    if pending is not None:
+        offset = pending["batch_offset"]
+        keep_bytes = pending_start
+    if os.path.getsize(checkpoint_file) > keep_bytes:
+        with open(checkpoint_file, "r+b") as f:
+            f.truncate(keep_bytes)
+    
+    if offset is None:
+        return None
+    
+    revalidating = f" (revalidating the batch at offset {offset})" if pending else ""
+    print(f"Resuming from checkpoint: {len(posts)} posts, offset {offset}{revalidating}")
+    return {"offset": offset, "posts": posts, "pending": pending}
 
 
-def load_checkpoint(checkpoint_file: str) -> Optional[dict]:
-    """Load checkpoint if it exists."""
-    if os.path.exists(checkpoint_file):
-        try:
-            with open(checkpoint_file, "r", encoding="utf-8") as f:
-                checkpoint = json.load(f)
-            print(f"Resuming from checkpoint: {len(checkpoint['posts'])} posts, offset {checkpoint['offset']}")
-            return checkpoint
-        except (json.JSONDecodeError, KeyError) as e:
-            print(f"Warning: Checkpoint corrupted, starting fresh: {e}")
-    return None
+def save_checkpoint(
+    checkpoint: BinaryIO,
+    posts: list,
+    offset: int,
+    batch_offset: Optional[int] = None,
+    etag: Optional[str] = None
+):
+    """
+    Append one batch of posts and the offset to resume from to the open
+    checkpoint log, plus the batch's own offset and ETag when the server sent
+    one. The write is buffered; see sync_checkpoint.
+    """
+    entry = {"offset": offset, "posts": posts}
+    if etag:
+        entry["batch_offset"] = batch_offset
+        entry["etag"] = etag
+    checkpoint.write(dumps_json(entry) + b"\n")
 
 
-def save_checkpoint(checkpoint_file: str, posts: list, offset: int):
-    """Save current progress to checkpoint file."""
-    checkpoint = {
-        "offset": offset,
-        "posts": posts,
-        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
-    }
-    with open(checkpoint_file, "w", encoding="utf-8") as f:
-        json.dump(checkpoint, f, indent=2, ensure_ascii=False)
+def sync_checkpoint(checkpoint: BinaryIO):
+    """Flush buffered checkpoint entries and fsync them to disk."""
+    checkpoint.flush()
+    os.fsync(checkpoint.fileno())
 
 
 def save_output(output_file: str, posts: list):
@@ -89,8 +207,11 @@ def save_output(output_file: str, posts: list):
         "scraped_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
         "posts": posts
     }
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(output, f, indent=2, ensure_ascii=False)
+    # Write to a temp file and swap it in, so a crash mid-write never leaves a torn output file
+    tmp_file = output_file + ".tmp"
+    with open(tmp_file, "wb") as f:
+        f.write(dumps_json(output, indent=True))
+    os.replace(tmp_file, output_file)
 
 
 def scrape_moltbook(
@@ -99,6 +220,8 @@ def scrape_moltbook(
     batch_size: int = DEFAULT_BATCH_SIZE,
     max_retries: int = DEFAULT_MAX_RETRIES,
     retry_delay: int = DEFAULT_RETRY_DELAY,
+    max_backoff: int = DEFAULT_MAX_BACKOFF,
+    max_workers: int = DEFAULT_MAX_WORKERS,
     resume: bool = True
 ):
     """
@@ -110,64 +233,151 @@ def scrape_moltbook(
         batch_size: Posts per API request
         max_retries: Max retry attempts per request
         retry_delay: Base delay between retries (seconds)
+        max_backoff: Upper bound on the exponential backoff delay (seconds)
+        max_workers: Number of batches fetched concurrently
         resume: Whether to resume from checkpoint
     """
-    checkpoint_file = output_file.replace(".json", "_checkpoint.json")
+    checkpoint_file = output_file.replace(".json", "_checkpoint.jsonl")
     
     checkpoint = load_checkpoint(checkpoint_file) if resume else None
     
     if checkpoint:
         posts = checkpoint["posts"]
         offset = checkpoint["offset"]
+        pending = checkpoint["pending"]
     else:
         posts = []
         offset = 0
+        pending = None
+        # The checkpoint is append-only, so a stale log must not be extended
+        if os.path.exists(checkpoint_file):
+            os.remove(checkpoint_file)
     
     print(f"\nScraping top {count} posts from Moltbook...")
-    print(f"   Batch size: {batch_size} | Output: {output_file}\n")
+    print(f"   Batch size: {batch_size} | Workers: {max_workers} | Output: {output_file}\n")
+    
+    # Size the connection pool to match the number of concurrent fetchers. Retries
+    # are handled in fetch_posts, so the adapter itself never retries.
+    _SESSION.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=max_workers, max_retries=0))
+    
+    rate_limiter = TokenBucket(capacity=DEFAULT_RATE_CAPACITY, rate=DEFAULT_RATE_PER_SECOND)
     
     consecutive_failures = 0
     batch_num = 1
+    synced_batch_num = batch_num
+    done = False
     
-    while len(posts) < count:
-        print(f"Batch {batch_num}: Fetching offset {offset}...")
-        
-        data = fetch_posts(offset=offset, limit=batch_size, max_retries=max_retries, retry_delay=retry_delay)
-        
-        if data is None:
-            consecutive_failures += 1
-            save_checkpoint(checkpoint_file, posts, offset + batch_size)
-            save_output(output_file, posts)
-            
-            if consecutive_failures >= 3:
-                print(f"\nWarning: Too many failures. Run again to resume from checkpoint.")
-                return posts
-            
-            offset += batch_size
-            batch_num += 1
-            time.sleep(5)
-            continue
-        
-        consecutive_failures = 0
-        
-        if not data.get("success") or not data.get("posts"):
-            print(f"  No more posts available")
-            break
-        
-        valid_posts = [p for p in data["posts"] if is_valid_post(p)]
-        posts.extend(valid_posts)
-        print(f"  Got {len(valid_posts)} posts (total: {len(posts)})")
-        
-        next_offset = data.get("next_offset", offset + batch_size)
-        save_checkpoint(checkpoint_file, posts, next_offset)
-        save_output(output_file, posts)
-        
-        if not data.get("has_more", False):
-            break
-        
-        offset = next_offset
-        batch_num += 1
-        time.sleep(1)  # Rate limiting
+    # Keep the checkpoint log open for the whole scrape and only fsync every few
+    # batches, so disk latency doesn't stall the fetch loop
+    checkpoint_log = open(checkpoint_file, "ab", buffering=CHECKPOINT_BUFFER_SIZE)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while len(posts) < count and not done:
+                # Fetch a window of consecutive offsets concurrently, but never
+                # more batches than are still needed to reach `count`
+                batches_needed = -(-(count - len(posts)) // batch_size)
+                offsets = [offset + i * batch_size for i in range(min(max_workers, batches_needed))]
+                
+                futures = {}
+                for i, batch_offset in enumerate(offsets):
+                    print(f"Batch {batch_num + i}: Fetching offset {batch_offset}...")
+                    future = executor.submit(
+                        fetch_posts,
+                        offset=batch_offset,
+                        limit=batch_size,
+                        max_retries=max_retries,
+                        retry_delay=retry_delay,
+                        max_backoff=max_backoff,
+                        rate_limiter=rate_limiter,
+                        etag=pending["etag"] if pending and batch_offset == pending["batch_offset"] else None
+                    )
+                    futures[future] = batch_offset
+                
+                results = {}
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+                
+                # Consume batches in offset order so posts keep their ranking.
+                # A batch is only used if it starts where the previous one ended;
+                # if the API reports a different next_offset, the rest of the
+                # window is dropped and refetched from there.
+                had_failure = False
+                for batch_offset in offsets:
+                    if batch_offset != offset:
+                        break
+                    
+                    data = results[batch_offset]
+                    
+                    if pending and offset == pending["batch_offset"] and (data is NOT_MODIFIED or data is None):
+                        # Keep the batch held back from the checkpoint, either because the
+                        # server confirmed it is unchanged or because it couldn't be refetched
+                        status = "unchanged" if data is NOT_MODIFIED else "could not be revalidated"
+                        posts.extend(pending["posts"])
+                        print(f"  Batch {batch_num}: Offset {offset} {status}, reusing checkpointed posts (total: {len(posts)})")
+                        save_checkpoint(checkpoint_log, pending["posts"], pending["offset"], offset, pending["etag"])
+                        offset = pending["offset"]
+                        batch_num += 1
+                        continue
+                    
+                    if data is None:
+                        had_failure = True
+                        consecutive_failures += 1
+                        save_checkpoint(checkpoint_log, [], offset + batch_size)
+                        
+                        if consecutive_failures >= 3:
+                            save_output(output_file, posts)
+                            print(f"\nWarning: Too many failures. Run again to resume from checkpoint.")
+                            return posts
+                        
+                        offset += batch_size
+                        batch_num += 1
+                        continue
+                    
+                    consecutive_failures = 0
+                    
+                    if not data.get("success") or not data.get("posts"):
+                        print(f"  No more posts available")
+                        done = True
+                        break
+                    
+                    # Keep only posts with non-null title and content, projected to PostRecords
+                    before = len(posts)
+                    for p in data["posts"]:
+                        if p.get("title") is None or p.get("content") is None:
+                            continue
+                        try:
+                            posts.append(PostRecord.from_api(p))
+                        except (KeyError, TypeError, AttributeError) as e:
+                            print(f"  Skipping malformed post {p.get('id')}: {type(e).__name__}: {e}")
+                    added = len(posts) - before
+                    print(f"  Batch {batch_num}: Got {added} posts (total: {len(posts)})")
+                    
+                    next_offset = data.get("next_offset", offset + batch_size)
+                    save_checkpoint(checkpoint_log, posts[before:], next_offset, offset, data.get("_etag"))
+                    
+                    offset = next_offset
+                    batch_num += 1
+                    
+                    if not data.get("has_more", False):
+                        done = True
+                        break
+                    
+                    if len(posts) >= count:
+                        break
+                
+                # The held-back batch is always the first offset of the first window
+                pending = None
+                
+                if batch_num - synced_batch_num >= CHECKPOINT_FSYNC_INTERVAL:
+                    sync_checkpoint(checkpoint_log)
+                    synced_batch_num = batch_num
+                
+                if had_failure and not done and len(posts) < count:
+                    time.sleep(5)
+    finally:
+        sync_checkpoint(checkpoint_log)
+        checkpoint_log.close()
+        _SESSION.close()
     
     posts = posts[:count]
     save_output(output_file, posts)
@@ -185,6 +395,7 @@ def main():
     parser.add_argument("--count", "-n", type=int, default=500, help="Number of posts to fetch (default: 500)")
     parser.add_argument("--output", "-o", type=str, default="moltbook_posts.json", help="Output file (default: moltbook_posts.json)")
     parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help=f"Batch size (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help=f"Concurrent batch fetches (default: {DEFAULT_MAX_WORKERS})")
     parser.add_argument("--no-resume", action="store_true", help="Don't resume from checkpoint")
     
     args = parser.parse_args()
@@ -193,6 +404,7 @@ def main():
         count=args.count,
         output_file=args.output,
         batch_size=args.batch_size,
+        max_workers=args.workers,
         resume=not args.no_resume
     )
 
@@ -13,16 +13,49 @@ This creates a dataset where each post is stored as an example with:
 """
 
 import argparse
-import json
 import os
+from itertools import islice
 from typing import Optional
-from langsmith import Client
+
+from upload_utils import iter_posts, load_uploaded_ids, make_client, uploaded_ids_path
+
+UPLOAD_CHUNK_SIZE = 100
+
+
+def build_example(post: dict) -> tuple:
+    """Build the (inputs, outputs, metadata) triple for one post."""
+    post_id = post["id"]
+    
+    inputs = {
+        "post_id": post_id,
+        "title": post["title"],
+        "author": post["author_name"],
+        "submolt": post["submolt_name"],
+        "created_at": post["created_at"],
+    }
+    
+    outputs = {
+        "content": post["content"],
+        "upvotes": post["upvotes"],
+        "downvotes": post["downvotes"],
+        "comment_count": post["comment_count"],
+    }
+    
+    metadata = {
+        "author_id": post["author_id"],
+        "submolt_id": post["submolt_id"],
+        "submolt_display_name": post["submolt_display_name"],
+        "url": f"https://www.moltbook.com/post/{post_id}",
+    }
+    
+    return inputs, outputs, metadata
 
 
 def upload_to_dataset(
     input_file: str,
     dataset_name: str = "moltbook_posts",
-    limit: Optional[int] = None
+    limit: Optional[int] = None,
+    uploaded_ids_file: Optional[str] = None
 ):
     """
     Upload Moltbook posts to a LangSmith dataset.
@@ -31,22 +64,23 @@ def upload_to_dataset(
         input_file: Path to JSON file with scraped posts
         dataset_name: Name for the LangSmith dataset
         limit: Optional limit on number of posts to upload
+        uploaded_ids_file: Ledger of already-uploaded post IDs (default: derived from dataset name)
     """
     if not os.environ.get("LANGSMITH_API_KEY"):
         print("Error: LANGSMITH_API_KEY environment variable not set")
         print("   Set it with: export LANGSMITH_API_KEY='your-api-key'")
         return
     
-    with open(input_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    if not os.path.exists(input_file):
+        print(f"Error: Input file not found: {input_file}")
+        return
     
-    posts = data["posts"]
-    if limit:
-        posts = posts[:limit]
+    posts = iter_posts(input_file, limit)
+    print(f"Streaming posts from {input_file}")
     
-    print(f"Loaded {len(posts)} posts from {input_file}")
+    uploaded_ids_file = uploaded_ids_file or uploaded_ids_path("dataset", dataset_name)
     
-    client = Client()
+    client = make_client()
     
     try:
         dataset = client.create_dataset(
@@ -61,46 +95,65 @@ def upload_to_dataset(
         else:
             raise e
     
+    uploaded_ids = load_uploaded_ids(uploaded_ids_file)
+    if uploaded_ids:
+        print(f"Found {len(uploaded_ids)} previously uploaded posts in {uploaded_ids_file}, will skip them")
+    
     success_count = 0
-    for i, post in enumerate(posts):
-        try:
-            inputs = {
-                "post_id": post["id"],
-                "title": post["title"],
-                "author": post["author"]["name"],
-                "submolt": post["submolt"]["name"],
-                "created_at": post["created_at"],
-            }
-            
-            outputs = {
-                "content": post["content"],
-                "upvotes": post["upvotes"],
-                "downvotes": post["downvotes"],
-                "comment_count": post["comment_count"],
-            }
+    total_count = 0
+    skipped_count = 0
+    
+    with open(uploaded_ids_file, "a", encoding="utf-8") as ledger:
+        # Upload in chunks through the bulk endpoint instead of one request per post
+        while chunk := list(islice(posts, UPLOAD_CHUNK_SIZE)):
+            all_inputs, all_outputs, all_metadata = [], [], []
+            for post in chunk:
+                if post["id"] in uploaded_ids:
+                    skipped_count += 1
+                    continue
+                total_count += 1
+                try:
+                    inputs, outputs, metadata = build_example(post)
+                except Exception as e:
+                    print(f"  Error uploading post {post['id']}: {e}")
+                    continue
+                all_inputs.append(inputs)
+                all_outputs.append(outputs)
+                all_metadata.append(metadata)
             
-            metadata = {
-                "author_id": post["author"]["id"],
-                "submolt_id": post["submolt"]["id"],
-                "submolt_display_name": post["submolt"]["display_name"],
-                "url": f"https://www.moltbook.com/post/{post['id']}",
-            }
+            if not all_inputs:
+                continue
             
-            client.create_example(
-                inputs=inputs,
-                outputs=outputs,
-                metadata=metadata,
-                dataset_id=dataset.id
-            )
-            success_count += 1
+            try:
+                client.create_examples(
+                    inputs=all_inputs,
+                    outputs=all_outputs,
+                    metadata=all_metadata,
+                    dataset_id=dataset.id
+                )
+                success_count += len(all_inputs)
+                ledger.writelines(f"{inputs['post_id']}\n" for inputs in all_inputs)
+            except Exception as e:
+                # Fall back to one request per post so a single bad example doesn't sink the chunk
+                print(f"  Bulk upload failed, retrying {len(all_inputs)} posts individually: {e}")
+                for inputs, outputs, metadata in zip(all_inputs, all_outputs, all_metadata):
+                    try:
+                        client.create_example(
+                            inputs=inputs,
+                            outputs=outputs,
+                            metadata=metadata,
+                            dataset_id=dataset.id
+                        )
+                        success_count += 1
+                        ledger.write(f"{inputs['post_id']}\n")
+                    except Exception as e:
+                        print(f"  Error uploading post {inputs['post_id']}: {e}")
             
-            if (i + 1) % 50 == 0:
-                print(f"  Uploaded {i + 1}/{len(posts)} posts...")
-                
-        except Exception as e:
-            print(f"  Error uploading post {post['id']}: {e}")
+            print(f"  Uploaded {success_count}/{total_count} posts...")
     
-    print(f"\nUploaded {success_count}/{len(posts)} posts to dataset '{dataset_name}'")
+    print(f"\nUploaded {success_count}/{total_count} posts to dataset '{dataset_name}'")
+    if skipped_count:
+        print(f"   Skipped {skipped_count} previously uploaded posts")
     print(f"   View at: https://smith.langchain.com/datasets")
 
 
@@ -109,13 +162,15 @@ def main():
     parser.add_argument("--input", "-i", type=str, default="moltbook_posts.json", help="Input JSON file")
     parser.add_argument("--dataset", "-d", type=str, default="moltbook_posts", help="Dataset name")
     parser.add_argument("--limit", "-n", type=int, default=None, help="Limit number of posts")
+    parser.add_argument("--uploaded-ids", type=str, default=None, help="Ledger of already-uploaded post IDs (default: uploaded_ids_dataset_<dataset>.txt)")
     
     args = parser.parse_args()
     
     upload_to_dataset(
         input_file=args.input,
         dataset_name=args.dataset,
-        limit=args.limit
+        limit=args.limit,
+        uploaded_ids_file=args.uploaded_ids
     )
 
 
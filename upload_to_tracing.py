@@ -13,18 +13,96 @@ This creates traces formatted as conversations for use with the Insights Agent:
 """
 
 import argparse
-import json
 import os
 import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 from typing import Optional
+
 from langsmith import Client
+from langsmith.utils import LangSmithNotFoundError
+
+from upload_utils import TokenBucket, iter_posts, load_uploaded_ids, make_client, uploaded_ids_path
+
+MAX_WORKERS = 8
+MAX_IN_FLIGHT = 2 * MAX_WORKERS
+RATE_CAPACITY = 16
+RATE_PER_SECOND = 8.0
+
+
+def upload_post(client: Client, post: dict, project_name: str, rate_limiter: TokenBucket):
+    """Upload a single post as a conversation trace."""
+    post_id = post["id"]
+    author = post["author_name"]
+    submolt = post["submolt_name"]
+    title = post["title"]
+    content = post["content"]
+    
+    # Format as conversation
+    inputs = {
+        "messages": [
+            {"role": "user", "content": f"Post by {author} in m/{submolt}: {title}"}
+        ]
+    }
+    
+    outputs = {
+        "messages": [
+            {"role": "assistant", "content": content}
+        ]
+    }
+    
+    metadata = {
+        "post_id": post_id,
+        "author": author,
+        "author_id": post["author_id"],
+        "submolt": submolt,
+        "submolt_id": post["submolt_id"],
+        "upvotes": post["upvotes"],
+        "downvotes": post["downvotes"],
+        "comment_count": post["comment_count"],
+        "created_at": post["created_at"],
+        "url": f"https://www.moltbook.com/post/{post_id}",
+    }
+    
+    run_id = str(uuid.uuid4())
+    created_at = datetime.fromisoformat(post["created_at"].replace("Z", "+00:00"))
+    
+    rate_limiter.acquire()
+    client.create_run(
+        name="moltbook_post",
+        run_type="chain",
+        inputs=inputs,
+        outputs=outputs,
+        project_name=project_name,
+        id=run_id,
+        start_time=created_at,
+        end_time=created_at,
+        extra={"metadata": metadata}
+    )
+
+
+def record_uploads(done, in_flight: dict, ledger, success_count: int, skipped_count: int) -> int:
+    """Report finished uploads and append successful post IDs to the ledger; returns the new success count."""
+    for future in done:
+        post_id = in_flight.pop(future)
+        try:
+            future.result()
+        except Exception as e:
+            print(f"  Error uploading post {post_id}: {e}")
+            continue
+        
+        success_count += 1
+        ledger.write(f"{post_id}\n")
+        if success_count % 50 == 0:
+            print(f"  Uploaded {success_count} traces ({skipped_count} skipped)...")
+    return success_count
 
 
 def upload_to_tracing(
     input_file: str,
     project_name: str = "moltbook-analysis",
-    limit: Optional[int] = None
+    limit: Optional[int] = None,
+    uploaded_ids_file: Optional[str] = None
 ):
     """
     Upload Moltbook posts to a LangSmith tracing project.
@@ -36,99 +114,89 @@ def upload_to_tracing(
         input_file: Path to JSON file with scraped posts
         project_name: Name for the LangSmith project
         limit: Optional limit on number of posts to upload
+        uploaded_ids_file: Ledger of already-uploaded post IDs (default: derived from project name)
     """
     if not os.environ.get("LANGSMITH_API_KEY"):
         print("Error: LANGSMITH_API_KEY environment variable not set")
         print("   Set it with: export LANGSMITH_API_KEY='your-api-key'")
         return
     
-    with open(input_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    if not os.path.exists(input_file):
+        print(f"Error: Input file not found: {input_file}")
+        return
     
-    posts = data["posts"]
-    if limit:
-        posts = posts[:limit]
+    posts = iter_posts(input_file, limit)
+    print(f"Streaming posts from {input_file}")
     
-    print(f"Loaded {len(posts)} posts from {input_file}")
+    uploaded_ids_file = uploaded_ids_file or uploaded_ids_path("tracing", project_name)
     
-    client = Client()
+    client = make_client()
     
-    # Get existing run IDs to avoid duplicates
-    existing_ids = set()
-    try:
-        existing_runs = client.list_runs(project_name=project_name, limit=1000)
-        for run in existing_runs:
-            if run.extra and run.extra.get("metadata", {}).get("post_id"):
-                existing_ids.add(run.extra["metadata"]["post_id"])
+    if os.path.exists(uploaded_ids_file):
+        existing_ids = load_uploaded_ids(uploaded_ids_file)
+        if existing_ids:
+            print(f"Found {len(existing_ids)} previously uploaded posts in {uploaded_ids_file}, will skip duplicates")
+    else:
+        # No local ledger yet: seed it from the traces already in the project. Page
+        # through every moltbook_post run and only pull the `extra` field with the metadata.
+        existing_ids = set()
+        try:
+            existing_runs = client.list_runs(
+                project_name=project_name,
+                run_type="chain",
+                filter='eq(name, "moltbook_post")',
+                select=["extra"],
+            )
+            for run in existing_runs:
+                post_id = (run.extra or {}).get("metadata", {}).get("post_id")
+                if post_id:
+                    existing_ids.add(post_id)
+        except LangSmithNotFoundError:
+            pass  # Project doesn't exist yet, so nothing has been uploaded
+        except Exception as e:
+            # Don't write a ledger from a failed or partial scan: later runs would
+            # trust it and re-upload everything it missed
+            print(f"Error: Could not list existing traces in '{project_name}': {e}")
+            print("   Run again to retry the duplicate check")
+            return
         if existing_ids:
             print(f"Found {len(existing_ids)} existing traces, will skip duplicates")
-    except Exception:
-        pass  # Project may not exist yet
+        with open(uploaded_ids_file, "w", encoding="utf-8") as ledger:
+            ledger.writelines(f"{post_id}\n" for post_id in existing_ids)
+    existing_ids = frozenset(existing_ids)
     
-    # Upload posts as traces
+    # Upload posts as traces, overlapping the independent create_run requests
     success_count = 0
     skipped_count = 0
+    rate_limiter = TokenBucket(capacity=RATE_CAPACITY, rate=RATE_PER_SECOND)
     
-    for i, post in enumerate(posts):
-        post_id = post["id"]
-        
-        if post_id in existing_ids:
-            skipped_count += 1
-            continue
-        
+    with open(uploaded_ids_file, "a", encoding="utf-8") as ledger, \
+            ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        # Keep only a bounded number of uploads queued so streamed posts aren't all
+        # held in memory, and record each one in the ledger as soon as it finishes
+        in_flight = {}
         try:
-            author = post["author"]["name"]
-            submolt = post["submolt"]["name"]
-            title = post["title"]
-            content = post["content"]
-            
-            # Format as conversation
-            inputs = {
-                "messages": [
-                    {"role": "user", "content": f"Post by {author} in m/{submolt}: {title}"}
-                ]
-            }
+            for post in posts:
+                if post["id"] in existing_ids:
+                    skipped_count += 1
+                    continue
+                if len(in_flight) >= MAX_IN_FLIGHT:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    success_count = record_uploads(done, in_flight, ledger, success_count, skipped_count)
+                future = executor.submit(upload_post, client, post, project_name, rate_limiter)
+                in_flight[future] = post["id"]
             
-            outputs = {
-                "messages": [
-                    {"role": "assistant", "content": content}
-                ]
-            }
-            
-            metadata = {
-                "post_id": post_id,
-                "author": author,
-                "author_id": post["author"]["id"],
-                "submolt": submolt,
-                "submolt_id": post["submolt"]["id"],
-                "upvotes": post["upvotes"],
-                "downvotes": post["downvotes"],
-                "comment_count": post["comment_count"],
-                "created_at": post["created_at"],
-                "url": f"https://www.moltbook.com/post/{post_id}",
-            }
-            
-            run_id = str(uuid.uuid4())
-            
-            client.create_run(
-                name="moltbook_post",
-                run_type="chain",
-                inputs=inputs,
-                outputs=outputs,
-                project_name=project_name,
-                id=run_id,
-                start_time=datetime.fromisoformat(post["created_at"].replace("Z", "+00:00")),
-                end_time=datetime.fromisoformat(post["created_at"].replace("Z", "+00:00")),
-                extra={"metadata": metadata}
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                success_count = record_uploads(done, in_flight, ledger, success_count, skipped_count)
+        finally:
+            # On interrupt, drop queued uploads and still record the ones already running
+            for future in in_flight:
+                future.cancel()
+            done, _ = wait(in_flight)
+            success_count = record_uploads(
+                [f for f in done if not f.cancelled()], in_flight, ledger, success_count, skipped_count
             )
-            
-            success_count += 1
-            
-            if (i + 1) % 50 == 0:
-                print(f"  Uploaded {success_count} traces ({skipped_count} skipped)...")
-                
-        except Exception as e:
-            print(f"  Error uploading post {post_id}: {e}")
     
     print(f"\nUploaded {success_count} new traces to project '{project_name}'")
     if skipped_count:
@@ -142,13 +210,15 @@ def main():
     parser.add_argument("--input", "-i", type=str, default="moltbook_posts.json", help="Input JSON file")
     parser.add_argument("--project", "-p", type=str, default="moltbook-analysis", help="Project name")
     parser.add_argument("--limit", "-n", type=int, default=None, help="Limit number of posts")
+    parser.add_argument("--uploaded-ids", type=str, default=None, help="Ledger of already-uploaded post IDs (default: uploaded_ids_tracing_<project>.txt)")
     
     args = parser.parse_args()
     
     upload_to_tracing(
         input_file=args.input,
         project_name=args.project,
-        limit=args.limit
+        limit=args.limit,
+        uploaded_ids_file=args.uploaded_ids
     )
 
 
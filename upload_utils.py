@@ -0,0 +1,134 @@
+"""
+Shared helpers for the Moltbook scripts.
+
+PostRecord is the flat post record the scraper writes and the upload
+scripts read. TokenBucket rate-limits the scraper's fetches and the tracing
+uploader's create_run calls. make_client() returns a process-wide LangSmith
+Client, so every upload in a process shares one HTTP session and its
+connection pool.
+
+Each upload target (dataset or tracing project) keeps a local ledger of the
+post IDs already uploaded to it, one per line, so re-runs can skip those
+posts without any network round-trip. Delete the ledger file to force a
+full re-upload.
+"""
+
+import functools
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from itertools import islice
+from typing import TYPE_CHECKING, Iterator, Optional
+
+import ijson
+
+if TYPE_CHECKING:
+    from langsmith import Client
+
+
+@dataclass(slots=True)
+class PostRecord:
+    """The fields of a Moltbook post that the upload scripts use."""
+    id: str
+    title: str
+    content: str
+    author_id: Optional[str]
+    author_name: Optional[str]
+    submolt_id: Optional[str]
+    submolt_name: Optional[str]
+    submolt_display_name: Optional[str]
+    upvotes: int
+    downvotes: int
+    comment_count: int
+    created_at: str
+    
+    @classmethod
+    def from_api(cls, post: dict) -> "PostRecord":
+        """Project a raw API post onto the fields kept downstream."""
+        author = post.get("author") or {}
+        submolt = post.get("submolt") or {}
+        return cls(
+            id=post["id"],
+            title=post["title"],
+            content=post["content"],
+            author_id=author.get("id"),
+            author_name=author.get("name"),
+            submolt_id=submolt.get("id"),
+            submolt_name=submolt.get("name"),
+            submolt_display_name=submolt.get("display_name"),
+            upvotes=post.get("upvotes", 0),
+            downvotes=post.get("downvotes", 0),
+            comment_count=post.get("comment_count", 0),
+            created_at=post["created_at"],
+        )
+
+
+class TokenBucket:
+    """Thread-safe token bucket: bursts up to `capacity` requests, then `rate` requests/second."""
+    
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+    
+    def acquire(self, n: float = 1):
+        """Block until `n` tokens are available, then consume them."""
+        with self._lock:
+            self._refill()
+            if self.tokens < n:
+                time.sleep((n - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= n
+
+
+@functools.lru_cache(maxsize=None)
+def make_client() -> "Client":
+    """
+    Create the LangSmith Client once per process and reuse it.
+    
+    The Client mounts its own pooled adapter (sized above the tracing
+    uploader's worker count) and retries failed requests itself, so its
+    session is left as configured.
+    """
+    # Imported here so the scraper can use TokenBucket without loading langsmith
+    from langsmith import Client
+    
+    return Client()
+
+
+def uploaded_ids_path(target_type: str, target_name: str) -> str:
+    """Default ledger path for an upload target, e.g. uploaded_ids_dataset_moltbook_posts.txt."""
+    return f"uploaded_ids_{target_type}_{target_name}.txt"
+
+
+def load_uploaded_ids(path: str) -> set:
+    """Load the set of post IDs recorded in a ledger file (empty if it doesn't exist)."""
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def iter_posts(input_file: str, limit: Optional[int] = None) -> Iterator[dict]:
+    """
+    Stream posts from the scraped JSON file without loading it all into memory.
+    
+    Posts saved by older scrapes in the API's nested author/submolt shape are
+    flattened to the PostRecord fields on the fly.
+    """
+    with open(input_file, "rb") as f:
+        for post in islice(ijson.items(f, "posts.item", use_float=True), limit):
+            if "author" in post:
+                try:
+                    post = asdict(PostRecord.from_api(post))
+                except (KeyError, TypeError, AttributeError):
+                    pass  # Left as-is so the upload reports this post's error
+            yield post